@@ -8,24 +8,13 @@ Sanity check:
 Fail fast if any slot is missing.
 """
 
-import re
-
 from slot_pools import SLOTS
-from templates import TEMPLATES
+from templates import iter_templates
 
-SLOT_PATTERN = re.compile(r"\{([a-zA-Z0-9_]+)\}")
 
 def extract_slots_from_templates():
-    used_slots = set()
-
-    for intent, gens in TEMPLATES.items():
-        for gen, templates in gens.items():
-            for tpl in templates:
-                matches = SLOT_PATTERN.findall(tpl)
-                for m in matches:
-                    used_slots.add(m)
-
-    return used_slots
+    # Slot names are parsed once per template at import (TemplateRef.slots).
+    return set().union(*(ref.slots for ref in iter_templates()))
 
 
 def main():
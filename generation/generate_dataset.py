@@ -11,6 +11,11 @@ Dataset specification (locked for this micro-study):
 - Generator families per intent: 5
 - Messages per generator family: 60
 
+Reproducibility:
+- The base seed is split with numpy's SeedSequence into one child seed per
+  (intent, generator) family; all of a family's random draws (slots and
+  perturbations) are batch-sampled from np.random.default_rng(child seed).
+
 Key contribution support:
 - Generator-aware evaluation:
   We assign a split label based on generator family:
@@ -19,8 +24,8 @@ Key contribution support:
   This enables robustness testing against template leakage.
 
 Outputs:
-- data/raw/messages.csv
-- data/raw/messages.parquet  (if pyarrow is available; otherwise parquet save will be skipped)
+- data/raw/messages.parquet  (snappy-compressed; written with pyarrow)
+- data/raw/messages.csv      (only with --csv, or as a fallback if parquet cannot be written)
 
 Columns:
 - message_id (str)
@@ -30,25 +35,40 @@ Columns:
 - intent_gold (str)
 - generator_id (str)
 - template_id (str)
-- seed (int)                -> per-row deterministic seed
+- seed (int)                -> seed of the row's family stream; _gen_family(ref, seed)
+                               regenerates the family, the row is its message_id index
 - split (str)               -> "train_gen" or "test_gen"
 - length_chars (int)
 - has_question_mark (bool)
 - applied_perturbations (str) -> semicolon-separated names (exactly 3)
+
+lang, source, intent_gold, generator_id, template_id and split are held as pandas
+"category" columns in memory (see CATEGORICAL_COLUMNS); CSV output is unaffected.
 """
 
 from __future__ import annotations
 
+import argparse
 import os
 import random
-import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
 
+import numpy as np
 import pandas as pd
-from perturbations import apply_perturbations
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    # Parquet output falls back to CSV without pyarrow (see save()).
+    pa = pq = None
+
+from perturbations import apply_perturbation_matrix, perturbation_names, sample_perturbation_matrix
 from slot_pools import SLOTS
-from templates import GENERATORS, INTENTS, TEMPLATES, stable_template_id
+from templates import GENERATORS, INTENTS, TemplateRef, family_refs
 
 # ---------------- Config (locked) ----------------
 
@@ -61,54 +81,87 @@ N_PERTURB = 3
 TRAIN_GENS = {"direct", "polite", "contextual"}
 TEST_GENS = {"constraint_heavy", "noisy"}
 
-SLOT_PATTERN = re.compile(r"\{([a-zA-Z0-9_]+)\}")
+_ROOT = Path(__file__).resolve().parents[1]  # project root
+
+# Output columns, in order.
+COLUMNS = (
+    "message_id", "text", "lang", "source", "intent_gold", "generator_id", "template_id",
+    "seed", "split", "length_chars", "has_question_mark", "applied_perturbations",
+)
+
+# Low-cardinality string columns, stored as pandas "category" (dictionary-encoded in parquet).
+CATEGORICAL_COLUMNS = ("lang", "source", "intent_gold", "generator_id", "template_id", "split")
+
+# One column's values: a list for string columns, a numpy array for numeric ones.
+ColumnBuffer = Union[List[str], np.ndarray]
 
 
 # ---------------- Helpers ----------------
 
+@lru_cache(maxsize=1)
 def ensure_output_dirs() -> Dict[str, Path]:
     """
     Ensure output directories exist.
 
+    The directories are created on the first call only; later calls return the cached paths.
+
     Returns:
         dict with keys 'raw' and 'processed' pointing to paths.
     """
-    root = Path(__file__).resolve().parents[1]  # project root
-    raw_dir = root / "data" / "raw"
-    proc_dir = root / "data" / "processed"
+    raw_dir = _ROOT / "data" / "raw"
+    proc_dir = _ROOT / "data" / "processed"
     raw_dir.mkdir(parents=True, exist_ok=True)
     proc_dir.mkdir(parents=True, exist_ok=True)
     return {"raw": raw_dir, "processed": proc_dir}
 
 
-def extract_slots(template: str) -> List[str]:
-    """Extract slot names from a template string."""
-    return SLOT_PATTERN.findall(template)
-
-
-def fill_template(template: str, rng: random.Random) -> str:
+def compile_template(ref: TemplateRef) -> Tuple[Callable[[np.ndarray], List[str]], Tuple[int, ...]]:
     """
-    Fill a template by sampling values for the slots it contains.
+    Turn a template into a batch slot-filling function.
+
+    The template's pre-parsed parts (TemplateRef.parts) are grouped into literal
+    chunks and slot pools (as object arrays) up front. Rendering builds the texts
+    column by column: each slot gathers its values for every row with one
+    fancy-index and appends them with one elementwise object-array concatenation.
+    No regex, str.format parsing or per-row Python loop is involved.
 
     Args:
-        template: template string containing {slots}
-        rng: random.Random instance
+        ref: template to compile.
 
     Returns:
-        Slot-filled text.
+        (render, pool_sizes) where render(picks) -> list of slot-filled texts. picks is
+        an int array of shape (rows, len(pool_sizes)) holding, per row, one index per
+        slot (in template order) into a pool of the matching size.
 
     Raises:
         KeyError: if a required slot is missing from slot pools.
     """
-    slots = extract_slots(template)
-    values: Dict[str, str] = {}
-
-    for s in slots:
-        if s not in SLOTS:
-            raise KeyError(f"Slot '{s}' not found in SLOTS. Template: {template}")
-        values[s] = rng.choice(SLOTS[s])
-
-    return template.format(**values)
+    head = ""
+    pools: List[np.ndarray] = []
+    literals: List[str] = []
+    for literal, slot in ref.parts:
+        if pools:
+            literals[-1] += literal
+        else:
+            head += literal
+        if slot is None:
+            continue
+        if slot not in SLOTS:
+            raise KeyError(f"Slot '{slot}' not found in SLOTS. Template: {ref.text}")
+        pools.append(np.array(SLOTS[slot], dtype=object))
+        literals.append("")
+
+    pairs = list(zip(pools, literals))
+
+    def render(picks: np.ndarray) -> List[str]:
+        out = np.full(picks.shape[0], head, dtype=object)
+        for s, (pool, lit) in enumerate(pairs):
+            out = out + pool[picks[:, s]]
+            if lit:
+                out = out + lit
+        return out.tolist()
+
+    return render, tuple(len(pool) for pool in pools)
 
 
 def generator_split(generator_id: str) -> str:
@@ -120,117 +173,246 @@ def generator_split(generator_id: str) -> str:
     raise ValueError(f"Unknown generator_id for split: {generator_id}")
 
 
-def make_message_id(intent: str, generator_id: str, idx: int) -> str:
+def message_id_prefix(intent: str, generator_id: str) -> str:
     """
-    Create a stable-ish message id.
+    Family-invariant prefix of a stable-ish message id; rows append f"{idx:04d}".
     Determinism is ensured by idx ordering and fixed loops.
     """
-    return f"msg_{intent}_{generator_id}_{idx:04d}"
+    return f"msg_{intent}_{generator_id}_"
 
 
 # ---------------- Main generation ----------------
 
-def generate(seed: int = 1337) -> pd.DataFrame:
+def _gen_family(ref: TemplateRef, family_seed: int) -> Dict[str, ColumnBuffer]:
     """
-    Generate the full synthetic dataset.
+    Generate the N_PER_GENERATOR rows of one (intent, generator) family.
+
+    Every random draw for the family (slot picks, perturbation picks, perturbation
+    internals) comes from np.random.default_rng(family_seed). That value is logged in
+    the seed column, so _gen_family(ref, row.seed) regenerates a row's family, and the
+    row is entry int(message_id[-4:]) of it. Families are independent given their seed,
+    so they can run in any order or in separate processes and still produce identical rows.
+
+    Returns:
+        Column buffers for this family (lists for strings, numpy arrays for numbers).
+    """
+    intent, gen = ref.intent, ref.generator
+    render, pool_sizes = compile_template(ref)
+
+    rng = np.random.default_rng(family_seed)
+    # Batch-sample every row's slot indices and perturbations for this family up front.
+    picks = rng.integers(0, pool_sizes, size=(N_PER_GENERATOR, len(pool_sizes)))
+    perturb_picks = sample_perturbation_matrix(rng, N_PER_GENERATOR, n=N_PERTURB)
+    # Perturbations take a random.Random; one per family, seeded from the family stream.
+    perturb_rng = random.Random(int(rng.integers(0, 2**63 - 1)))
+
+    filled = render(picks)
+    text_col = apply_perturbation_matrix(filled, perturb_picks, perturb_rng)
+    perturb_col = [perturbation_names(tuple(row)) for row in perturb_picks.tolist()]
+
+    # Family-invariant values, computed once.
+    split = generator_split(gen)
+    msg_prefix = message_id_prefix(intent, gen)
+
+    msg_id_col = [f"{msg_prefix}{j:04d}" for j in range(N_PER_GENERATOR)]
+    length_col = np.empty(N_PER_GENERATOR, dtype=np.int32)
+    has_q_col = np.empty(N_PER_GENERATOR, dtype=bool)
+
+    for j, perturbed in enumerate(text_col):
+        length_col[j] = len(perturbed)
+        has_q_col[j] = "?" in perturbed
+
+    return {
+        "message_id": msg_id_col,
+        "text": text_col,
+        "intent_gold": [intent] * N_PER_GENERATOR,
+        "generator_id": [gen] * N_PER_GENERATOR,
+        "template_id": [ref.template_id] * N_PER_GENERATOR,
+        "seed": np.full(N_PER_GENERATOR, family_seed, dtype=np.int64),
+        "split": [split] * N_PER_GENERATOR,
+        "length_chars": length_col,
+        "has_question_mark": has_q_col,
+        "applied_perturbations": perturb_col,
+    }
+
+
+def generate_columns(seed: int = 1337, workers: Optional[int] = 1) -> Dict[str, ColumnBuffer]:
+    """
+    Generate the full synthetic dataset as column buffers (one entry per output column).
 
     Args:
         seed: base seed for reproducibility.
+        workers: number of processes to spread the (intent, generator) families over.
+            1 runs in-process; None uses os.cpu_count() (1 if unknown). Output does not depend on it.
 
     Returns:
-        pandas DataFrame with 2,400 rows.
+        dict of column name -> list (strings) or numpy array (numbers), in COLUMNS order,
+        each with 2,400 rows.
     """
-    rows = []
-    global_rng = random.Random(seed)
-
-    for intent in INTENTS:
-        if intent not in TEMPLATES:
-            raise KeyError(f"Missing intent in TEMPLATES: {intent}")
-
-        for gen in GENERATORS:
-            if gen not in TEMPLATES[intent]:
-                raise KeyError(f"Missing generator '{gen}' under intent '{intent}'")
-
-            templates = TEMPLATES[intent][gen]
-            if not templates:
-                raise ValueError(f"No templates for intent='{intent}', gen='{gen}'")
-
-            # For now, we assume 1 template per family as designed.
-            # If you add more templates later, sample among them here.
-            template = templates[0]
-            template_id = stable_template_id(intent, gen, 0, template)
-
-            for j in range(N_PER_GENERATOR):
-                # Per-row deterministic seed derived from base seed + counters
-                row_seed = global_rng.randint(0, 2**31 - 1)
-                rng = random.Random(row_seed)
-
-                filled = fill_template(template, rng)
-                perturbed, applied = apply_perturbations(filled, rng, n=N_PERTURB)
-
-                msg_id = make_message_id(intent, gen, j)
-
-                rows.append({
-                    "message_id": msg_id,
-                    "text": perturbed,
-                    "lang": LANG,
-                    "source": SOURCE,
-                    "intent_gold": intent,
-                    "generator_id": gen,
-                    "template_id": template_id,
-                    "seed": row_seed,
-                    "split": generator_split(gen),
-                    "length_chars": len(perturbed),
-                    "has_question_mark": "?" in perturbed,
-                    "applied_perturbations": ";".join(applied),
-                })
-
-    df = pd.DataFrame(rows)
+    # For now, we assume 1 template per family as designed.
+    # If you add more templates later, sample among them here.
+    # (templates.py validates at import that every family has at least one template.)
+    refs = [family_refs(intent, gen)[0] for intent in INTENTS for gen in GENERATORS]
+
+    # One independent child stream per (intent, generator) family, so every family
+    # is reproducible from the base seed without creating an RNG object per row.
+    # Each child is reduced to a 32-bit int: that int is what seeds the family and
+    # what the seed column logs.
+    family_seeds = [int(child.generate_state(1)[0]) for child in np.random.SeedSequence(seed).spawn(len(refs))]
+
+    # os.cpu_count() may return None; run in-process then.
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            families = list(executor.map(_gen_family, refs, family_seeds))
+    else:
+        families = list(map(_gen_family, refs, family_seeds))
 
     # Fail-fast sanity checks
-    expected = len(INTENTS) * len(GENERATORS) * N_PER_GENERATOR
-    if len(df) != expected:
-        raise AssertionError(f"Row count mismatch: got {len(df)} expected {expected}")
-
     # Check balance per (intent, generator)
-    grp = df.groupby(["intent_gold", "generator_id"]).size()
-    if (grp != N_PER_GENERATOR).any():
-        bad = grp[grp != N_PER_GENERATOR]
-        raise AssertionError(f"Unbalanced groups:\n{bad}")
+    bad = [(ref.intent, ref.generator, len(fam["text"])) for ref, fam in zip(refs, families)
+           if len(fam["text"]) != N_PER_GENERATOR]
+    if bad:
+        raise AssertionError(f"Unbalanced groups (intent, generator, n): {bad}")
+
+    total = sum(len(fam["text"]) for fam in families)
+    expected = len(INTENTS) * len(GENERATORS) * N_PER_GENERATOR
+    if total != expected:
+        raise AssertionError(f"Row count mismatch: got {total} expected {expected}")
+
+    merged: Dict[str, ColumnBuffer] = {}
+    for col in ("message_id", "text", "intent_gold", "generator_id", "template_id", "split", "applied_perturbations"):
+        values: List[str] = []
+        for fam in families:
+            values.extend(fam[col])
+        merged[col] = values
+    for col in ("seed", "length_chars", "has_question_mark"):
+        merged[col] = np.concatenate([fam[col] for fam in families])
+    merged["lang"] = [LANG] * total
+    merged["source"] = [SOURCE] * total
 
     # Check perturbations count is exactly N_PERTURB per row
-    counts = df["applied_perturbations"].apply(lambda s: 0 if not s else len(s.split(";")))
+    ap = np.array(merged["applied_perturbations"], dtype=str)
+    counts = np.where(np.char.str_len(ap) == 0, 0, np.char.count(ap, ";") + 1)
     if not (counts == N_PERTURB).all():
-        bad_rows = df.loc[counts != N_PERTURB, ["message_id", "applied_perturbations"]].head(10)
+        bad_rows = [(merged["message_id"][i], ap[i]) for i in np.flatnonzero(counts != N_PERTURB)[:10]]
         raise AssertionError(f"Perturbation count mismatch in some rows. Examples:\n{bad_rows}")
 
+    return {col: merged[col] for col in COLUMNS}
+
+
+def to_frame(columns: Dict[str, ColumnBuffer]) -> pd.DataFrame:
+    """Build the pandas view of generate_columns() output (CATEGORICAL_COLUMNS as category)."""
+    df = pd.DataFrame(columns)
+    for col in CATEGORICAL_COLUMNS:
+        df[col] = df[col].astype("category")
     return df
 
 
-def save(df: pd.DataFrame) -> None:
+def to_arrow_table(columns: Dict[str, ColumnBuffer]) -> "pa.Table":
+    """
+    Build a pyarrow Table straight from generate_columns() output, without a pandas round-trip.
+
+    CATEGORICAL_COLUMNS are dictionary-encoded, matching the category columns of to_frame().
     """
-    Save dataset to CSV and Parquet (if pyarrow available).
+    if pa is None:
+        raise ImportError("pyarrow is required to build an Arrow table")
+
+    arrays = {}
+    for col, values in columns.items():
+        if col in CATEGORICAL_COLUMNS:
+            # Sorted dictionary, matching the category order pandas assigns in to_frame().
+            dictionary, indices = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+            arrays[col] = pa.DictionaryArray.from_arrays(indices.astype(np.int32), pa.array(dictionary, pa.string()))
+        elif isinstance(values, np.ndarray):
+            arrays[col] = pa.array(values)
+        else:
+            arrays[col] = pa.array(values, pa.string())
+    return pa.table(arrays)
+
+
+def generate(seed: int = 1337, workers: Optional[int] = 1) -> pd.DataFrame:
     """
-    dirs = ensure_output_dirs()
-    raw_dir = dirs["raw"]
+    Generate the full synthetic dataset.
+
+    Args:
+        seed: base seed for reproducibility.
+        workers: see generate_columns().
+
+    Returns:
+        pandas DataFrame with 2,400 rows.
+    """
+    return to_frame(generate_columns(seed=seed, workers=workers))
+
+
+def save(data: Union[pd.DataFrame, Dict[str, ColumnBuffer]], formats: Sequence[str] = ("parquet",)) -> List[Path]:
+    """
+    Save dataset to data/raw in the requested formats.
+
+    Parquet (pyarrow, snappy) is the primary output. CSV is only written when
+    requested, or as a fallback if parquet cannot be written (e.g. pyarrow missing).
+    An existing messages.parquet that this call does not rewrite is removed, so
+    readers never pick up a stale parquet over the fresh CSV.
 
-    csv_path = raw_dir / "messages.csv"
-    df.to_csv(csv_path, index=False)
+    Args:
+        data: generated dataset, either a DataFrame from generate() or column buffers
+            from generate_columns(). Column buffers are written to parquet directly
+            through Arrow, without building a DataFrame.
+        formats: any of "parquet", "csv".
+
+    Returns:
+        Paths that were written.
+    """
+    unknown = set(formats) - {"parquet", "csv"}
+    if unknown:
+        raise ValueError(f"Unknown output format(s): {sorted(unknown)}")
 
+    dirs = ensure_output_dirs()
+    raw_dir = dirs["raw"]
+    written: List[Path] = []
+    write_csv = "csv" in formats
     parquet_path = raw_dir / "messages.parquet"
-    try:
-        df.to_parquet(parquet_path, index=False)
-    except Exception as e:
-        # Parquet may fail if pyarrow/fastparquet isn't installed.
-        # CSV is still sufficient for the micro-study.
-        print(f"[WARN] Could not write parquet: {e}")
 
-    print(f"[OK] Wrote: {csv_path}")
-    print(f"[OK] Wrote: {parquet_path} (if supported)")
+    if "parquet" in formats:
+        try:
+            if isinstance(data, pd.DataFrame):
+                data.to_parquet(parquet_path, index=False, compression="snappy", engine="pyarrow")
+            else:
+                # Build the table first: it raises a clear ImportError when pyarrow is missing.
+                table = to_arrow_table(data)
+                pq.write_table(table, parquet_path, compression="snappy")
+            written.append(parquet_path)
+        except Exception as e:
+            # Parquet may fail if pyarrow isn't installed; CSV is still sufficient.
+            print(f"[WARN] Could not write parquet ({e}); writing CSV instead.")
+            write_csv = True
+
+    if parquet_path not in written:
+        # load_dataset() prefers parquet, so don't leave an older (or partial) file
+        # next to the CSV written by this call.
+        parquet_path.unlink(missing_ok=True)
+
+    if write_csv:
+        csv_path = raw_dir / "messages.csv"
+        df = data if isinstance(data, pd.DataFrame) else to_frame(data)
+        df.to_csv(csv_path, index=False)
+        written.append(csv_path)
+
+    for path in written:
+        print(f"[OK] Wrote: {path}")
+    return written
 
 
 if __name__ == "__main__":
-    df = generate(seed=1337)
-    save(df)
-    print(df.head(5).to_string(index=False))
+    parser = argparse.ArgumentParser(description="Generate the synthetic messages dataset.")
+    parser.add_argument("--csv", action="store_true", help="also write data/raw/messages.csv")
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="processes to generate (intent, generator) families in; 0 = one per CPU",
+    )
+    args = parser.parse_args()
+
+    columns = generate_columns(seed=1337, workers=args.workers or None)
+    save(columns, formats=("parquet", "csv") if args.csv else ("parquet",))
+    print(to_frame({col: values[:5] for col, values in columns.items()}).to_string(index=False))
     print("\n[OK] Dataset generation complete.")
@@ -15,6 +15,9 @@ Design goals:
 
 Usage:
 - Call `apply_perturbations(text, rng, n=3)` to apply exactly n perturbations.
+- For batch generation, draw all picks with `sample_perturbation_matrix(np_rng, rows, n=3)`
+  and apply them with `apply_perturbation_matrix(texts, picks, rng)` (grouped, batched) or
+  row by row with `apply_indexed_perturbations(text, picks, rng)`.
 - Store returned `applied` list for analysis.
 
 Important:
@@ -25,12 +28,42 @@ from __future__ import annotations
 
 import random
 import re
-from typing import Callable, List, Tuple
+from functools import lru_cache
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
 
 # ---------- Small utilities ----------
 
 _WORD_BOUNDARY = re.compile(r"\b")
 
+_ELLIPSIS_SUFFIXES = ("...", "…")
+_END_PUNCT = "?.!…"
+_SWAP_TO_QUESTION = (".", "!")  # trailing chars _add_extra_question_mark replaces with '?'
+
+# Word-level swaps, compiled once at import (case-insensitive).
+_SYNONYM_SWAPS: List[Tuple[re.Pattern, str]] = [
+    (re.compile(pat, re.IGNORECASE), repl)
+    for pat, repl in [
+        (r"\bexplain\b", "describe"),
+        (r"\bfix\b", "resolve"),
+        (r"\bplan\b", "schedule"),
+        (r"\bcompute\b", "calculate"),
+        (r"\bbriefly\b", "quickly"),
+    ]
+]
+
+_TYPO_SWAPS: List[Tuple[re.Pattern, str]] = [
+    (re.compile(pat, re.IGNORECASE), repl)
+    for pat, repl in [
+        (r"\bwhat's\b", "whats"),
+        (r"\bplease\b", "pls"),
+        (r"\bcan't\b", "cant"),
+        (r"\bthanks\b", "thx"),
+        (r"\bI don't know\b", "idk"),
+    ]
+]
+
 
 def _lowercase_first_char(text: str) -> str:
     if not text:
@@ -39,22 +72,20 @@ def _lowercase_first_char(text: str) -> str:
 
 
 def _add_extra_question_mark(text: str) -> str:
-    # If already ends with punctuation, add an extra '?' occasionally.
-    if text.endswith("?"):
-        return text + "?"
-    if text.endswith(".") or text.endswith("!"):
+    # '.'/'!' endings become '?'; anything else (including an existing '?') gets one appended.
+    if text[-1:] in _SWAP_TO_QUESTION:
         return text[:-1] + "?"
     return text + "?"
 
 
 def _add_ellipsis(text: str) -> str:
-    if text.endswith(("...", "…")):
+    if text.endswith(_ELLIPSIS_SUFFIXES):
         return text
     return text + "..."
 
 
 def _strip_end_punct(text: str) -> str:
-    return text.rstrip("?.!…")
+    return text.rstrip(_END_PUNCT)
 
 
 def _inject_politeness(text: str, rng: random.Random) -> str:
@@ -97,15 +128,8 @@ def _synonym_swap(text: str, rng: random.Random) -> str:
     Very small, safe synonym swaps.
     We avoid large paraphrases to keep control.
     """
-    swaps = [
-        (r"\bexplain\b", "describe"),
-        (r"\bfix\b", "resolve"),
-        (r"\bplan\b", "schedule"),
-        (r"\bcompute\b", "calculate"),
-        (r"\bbriefly\b", "quickly"),
-    ]
-    pat, repl = rng.choice(swaps)
-    return re.sub(pat, repl, text, flags=re.IGNORECASE)
+    pat, repl = rng.choice(_SYNONYM_SWAPS)
+    return pat.sub(repl, text)
 
 
 def _minor_typo(text: str, rng: random.Random) -> str:
@@ -113,15 +137,8 @@ def _minor_typo(text: str, rng: random.Random) -> str:
     Introduce minor, common chat typos.
     Keep it mild: do NOT destroy readability.
     """
-    replacements = [
-        (r"\bwhat's\b", "whats"),
-        (r"\bplease\b", "pls"),
-        (r"\bcan't\b", "cant"),
-        (r"\bthanks\b", "thx"),
-        (r"\bI don't know\b", "idk"),
-    ]
-    pat, repl = rng.choice(replacements)
-    return re.sub(pat, repl, text, flags=re.IGNORECASE)
+    pat, repl = rng.choice(_TYPO_SWAPS)
+    return pat.sub(repl, text)
 
 
 def _inject_constraint_phrase(text: str, rng: random.Random) -> str:
@@ -159,7 +176,7 @@ PerturbFnRNG = Callable[[str, random.Random], str]
 
 # Each entry: (name, function, uses_rng, weight)
 # Weights define sampling probability.
-PERTURBATIONS: List[Tuple[str, object, bool, float]] = [
+_RAW_PERTURBATIONS: List[Tuple[str, Callable[..., str], bool, float]] = [
     ("lowercase_first_char", _lowercase_first_char, False, 1.0),
     ("extra_question_mark", _add_extra_question_mark, False, 0.9),
     ("ellipsis", _add_ellipsis, False, 0.6),
@@ -173,7 +190,48 @@ PERTURBATIONS: List[Tuple[str, object, bool, float]] = [
 ]
 
 
-def sample_perturbations(rng: random.Random, n: int = 3) -> List[Tuple[str, object, bool]]:
+def _ignore_rng(fn: PerturbFn) -> PerturbFnRNG:
+    return lambda text, _rng: fn(text)
+
+
+# Registry used at runtime: (name, fn(text, rng), weight). Functions that don't use
+# randomness are wrapped once here, so callers never branch on uses_rng.
+PERTURBATIONS: List[Tuple[str, PerturbFnRNG, float]] = [
+    (name, fn if uses_rng else _ignore_rng(fn), weight)
+    for name, fn, uses_rng, weight in _RAW_PERTURBATIONS
+]
+
+_WEIGHTS = np.array([p[2] for p in PERTURBATIONS], dtype=np.float64)
+
+
+# ---------- Batch variants ----------
+# Same semantics as the single-text functions above, applied to a whole group of texts.
+
+def _lowercase_first_char_batch(texts: Sequence[str]) -> List[str]:
+    return [t[:1].lower() + t[1:] for t in texts]
+
+
+def _add_extra_question_mark_batch(texts: Sequence[str]) -> List[str]:
+    return [t[:-1] + "?" if t[-1:] in _SWAP_TO_QUESTION else t + "?" for t in texts]
+
+
+def _add_ellipsis_batch(texts: Sequence[str]) -> List[str]:
+    return [t if t.endswith(_ELLIPSIS_SUFFIXES) else t + "..." for t in texts]
+
+
+def _strip_end_punct_batch(texts: Sequence[str]) -> List[str]:
+    return [t.rstrip(_END_PUNCT) for t in texts]
+
+
+_BATCH_FNS: Dict[str, Callable[[Sequence[str]], List[str]]] = {
+    "lowercase_first_char": _lowercase_first_char_batch,
+    "extra_question_mark": _add_extra_question_mark_batch,
+    "ellipsis": _add_ellipsis_batch,
+    "strip_end_punct": _strip_end_punct_batch,
+}
+
+
+def sample_perturbations(rng: random.Random, n: int = 3) -> List[Tuple[str, PerturbFnRNG]]:
     """
     Sample exactly n unique perturbations according to weights.
 
@@ -182,33 +240,134 @@ def sample_perturbations(rng: random.Random, n: int = 3) -> List[Tuple[str, obje
         n: number of perturbations to sample (default: 3).
 
     Returns:
-        List of (name, fn, uses_rng) tuples.
+        List of (name, fn) tuples, where fn(text, rng) applies the perturbation.
     """
     if n <= 0:
         return []
 
-    names = [p[0] for p in PERTURBATIONS]
-    weights = [p[3] for p in PERTURBATIONS]
+    indices = range(len(PERTURBATIONS))
+    weights = [p[2] for p in PERTURBATIONS]
+    full = (1 << len(PERTURBATIONS)) - 1
 
     chosen = []
-    chosen_names = set()
+    mask = 0  # bit i set once PERTURBATIONS[i] has been chosen
 
     # Weighted sampling without replacement.
     # Simple loop is fine because the list is small.
     while len(chosen) < n:
-        pick = rng.choices(PERTURBATIONS, weights=weights, k=1)[0]
-        if pick[0] in chosen_names:
+        i = rng.choices(indices, weights=weights, k=1)[0]
+        if mask & (1 << i):
             continue
-        chosen.append((pick[0], pick[1], pick[2]))
-        chosen_names.add(pick[0])
+        mask |= 1 << i
+        pick = PERTURBATIONS[i]
+        chosen.append((pick[0], pick[1]))
 
         # Safety: avoid infinite loops if n > available
-        if len(chosen_names) == len(names):
+        if mask == full:
             break
 
     return chosen
 
 
+def sample_perturbation_matrix(rng: np.random.Generator, rows: int, n: int = 3) -> np.ndarray:
+    """
+    Sample n unique perturbation indices per row for a whole batch at once.
+
+    Uses the Gumbel-top-k trick: each perturbation gets an exponential key scaled by
+    1/weight, and the n smallest keys per row (in ascending order) are a weighted
+    sample without replacement, equivalent to sequential weighted draws.
+
+    Args:
+        rng: numpy Generator for reproducibility.
+        rows: number of rows to sample for.
+        n: number of perturbations per row (default: 3).
+
+    Returns:
+        int array of shape (rows, n) indexing into PERTURBATIONS.
+    """
+    n = min(max(n, 0), len(PERTURBATIONS))
+    if n == 0:
+        return np.empty((rows, 0), dtype=np.intp)
+
+    keys = rng.exponential(size=(rows, len(PERTURBATIONS))) / _WEIGHTS
+    top = np.argpartition(keys, n - 1, axis=1)[:, :n]
+    order = np.argsort(np.take_along_axis(keys, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+def apply_indexed_perturbations(text: str, picks: Sequence[int], rng: random.Random) -> Tuple[str, List[str]]:
+    """
+    Apply pre-sampled perturbations (indices into PERTURBATIONS) in order.
+
+    Args:
+        text: input string (already slot-filled).
+        picks: perturbation indices, e.g. one row of sample_perturbation_matrix.
+        rng: random.Random instance for perturbations that use randomness.
+
+    Returns:
+        (new_text, applied_names)
+    """
+    applied = []
+    out = text
+
+    for i in picks:
+        name, fn, _w = PERTURBATIONS[i]
+        out = fn(out, rng)
+        applied.append(name)
+
+    return out, applied
+
+
+def apply_perturbation_matrix(texts: Sequence[str], picks: np.ndarray, rng: random.Random) -> List[str]:
+    """
+    Apply a (rows, n) matrix of perturbation picks to a batch of texts.
+
+    Runs one pass per pick position. Within a pass, rows are grouped by the perturbation
+    they drew and each group is transformed by one batched call, so the per-row work is
+    a list comprehension rather than a Python-level dispatch per (row, perturbation).
+
+    Groups are visited in PERTURBATIONS order and rows within a group in row order, so the
+    result is deterministic for a given rng state (RNG draws are consumed in a different
+    order than applying each row with apply_indexed_perturbations).
+
+    Args:
+        texts: input strings (already slot-filled).
+        picks: int array of shape (len(texts), n), e.g. from sample_perturbation_matrix.
+        rng: random.Random instance for perturbations that use randomness.
+
+    Returns:
+        Perturbed texts, aligned with the input.
+    """
+    out = list(texts)
+    for pos in range(picks.shape[1]):
+        col = picks[:, pos]
+        # Rows sorted by pick (stable), then split into one contiguous run per perturbation.
+        order = np.argsort(col, kind="stable").tolist()
+        start = 0
+        for i, count in enumerate(np.bincount(col, minlength=len(PERTURBATIONS)).tolist()):
+            if not count:
+                continue
+            rows = order[start:start + count]
+            start += count
+
+            name, fn, _w = PERTURBATIONS[i]
+            group = [out[r] for r in rows]
+            batch_fn = _BATCH_FNS.get(name)
+            if batch_fn is not None:
+                group = batch_fn(group)
+            else:
+                group = [fn(t, rng) for t in group]
+            for r, t in zip(rows, group):
+                out[r] = t
+    return out
+
+
+@lru_cache(maxsize=None)
+def perturbation_names(picks: Tuple[int, ...]) -> str:
+    """Semicolon-joined names for a pick tuple, as logged in applied_perturbations."""
+    return ";".join(PERTURBATIONS[i][0] for i in picks)
+
+
 def apply_perturbations(text: str, rng: random.Random, n: int = 3) -> Tuple[str, List[str]]:
     """
     Apply exactly n sampled perturbations to text.
@@ -224,12 +383,8 @@ def apply_perturbations(text: str, rng: random.Random, n: int = 3) -> Tuple[str,
     applied = []
     out = text
 
-    for name, fn, uses_rng in sample_perturbations(rng, n=n):
-        before = out
-        if uses_rng:
-            out = fn(out, rng)  # type: ignore[misc]
-        else:
-            out = fn(out)       # type: ignore[misc]
+    for name, fn in sample_perturbations(rng, n=n):
+        out = fn(out, rng)
 
         # Always log sampled perturbations to enforce "exactly n" reporting.
         applied.append(name)
@@ -30,9 +30,10 @@ Expected downstream usage:
 
 from __future__ import annotations
 
-from dataclasses import dataclass
-from hashlib import sha1
-from typing import Dict, List, Tuple
+from hashlib import blake2b
+from string import Formatter
+from types import MappingProxyType
+from typing import Dict, FrozenSet, List, Mapping, Optional, Tuple
 
 # Locked taxonomy (do not rename once experiments start; affects reproducibility).
 INTENTS: Tuple[str, ...] = (
@@ -55,7 +56,19 @@ GENERATORS: Tuple[str, ...] = (
 )
 
 
-@dataclass(frozen=True)
+# Version of the stable_template_id hashing scheme.
+# Unversioned (pre-"b1") IDs were sha1(payload).hexdigest()[:8].
+TEMPLATE_ID_SCHEME = "b1"
+
+
+_Parts = Tuple[Tuple[str, Optional[str]], ...]
+
+
+def parse_template(text: str) -> _Parts:
+    """Split a template into (literal, slot_name) pairs; slot_name is None for trailing text."""
+    return tuple((lit, name) for lit, name, _spec, _conv in Formatter().parse(text))
+
+
 class TemplateRef:
     """
     A lightweight reference to a specific template string.
@@ -65,13 +78,79 @@ class TemplateRef:
         generator: One of GENERATORS.
         index: Index in the templates list for (intent, generator).
         text: The template string itself.
-        template_id: Stable ID derived from (intent, generator, index, text).
+        template_id: Stable ID derived from (intent, generator, index, text); hashed
+            on first access and stored on the ref, so unused families are never hashed.
+        parts: parse_template(text), so fill() never re-parses the format string.
+        slots: Names of the slots the template uses (e.g. "constraint" in ref.slots).
+
+    Refs are immutable (assignment after construction raises AttributeError);
+    equality and hashing use (intent, generator, index, text).
     """
+    __slots__ = ("intent", "generator", "index", "text", "parts", "slots", "_id")
+
     intent: str
     generator: str
     index: int
     text: str
-    template_id: str
+    parts: _Parts
+    slots: FrozenSet[str]
+    _id: Optional[str]
+
+    def __init__(self, intent: str, generator: str, index: int, text: str,
+                 template_id: Optional[str] = None) -> None:
+        parts = parse_template(text)
+        init = object.__setattr__
+        init(self, "intent", intent)
+        init(self, "generator", generator)
+        init(self, "index", index)
+        init(self, "text", text)
+        init(self, "parts", parts)
+        init(self, "slots", frozenset(name for _, name in parts if name))
+        init(self, "_id", template_id)
+
+    def __setattr__(self, name: str, value: object) -> None:
+        raise AttributeError(f"TemplateRef is immutable; cannot set {name!r}")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"TemplateRef is immutable; cannot delete {name!r}")
+
+    def __reduce__(self) -> Tuple[type, Tuple[str, str, int, str, Optional[str]]]:
+        # Rebuild through __init__ (the default slot-state restore would go through __setattr__).
+        return (TemplateRef, (self.intent, self.generator, self.index, self.text, self._id))
+
+    @property
+    def template_id(self) -> str:
+        tid = self._id
+        if tid is None:
+            tid = stable_template_id(self.intent, self.generator, self.index, self.text)
+            # Memoizing is the one write allowed after __init__; it doesn't change equality.
+            object.__setattr__(self, "_id", tid)
+        return tid
+
+    def _key(self) -> Tuple[str, str, int, str]:
+        return (self.intent, self.generator, self.index, self.text)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, TemplateRef):
+            return NotImplemented
+        return self._key() == other._key()
+
+    def __hash__(self) -> int:
+        return hash(self._key())
+
+    def __repr__(self) -> str:
+        return (f"TemplateRef(intent={self.intent!r}, generator={self.generator!r}, "
+                f"index={self.index!r}, text={self.text!r})")
+
+    def fill(self, slots: Mapping[str, str]) -> str:
+        """
+        Substitute slot values into the template (same result as text.format(**slots)
+        for the plain {slot} placeholders used in TEMPLATES).
+
+        Raises:
+            KeyError: if a slot used by the template is missing from slots.
+        """
+        return "".join([lit if name is None else lit + slots[name] for lit, name in self.parts])
 
 
 def stable_template_id(intent: str, generator: str, index: int, text: str) -> str:
@@ -79,7 +158,9 @@ def stable_template_id(intent: str, generator: str, index: int, text: str) -> st
     Create a stable, human-safe template ID.
 
     We hash the defining fields to ensure IDs are stable across runs
-    as long as template text and ordering do not change.
+    as long as template text and ordering do not change. The hash is a 4-byte
+    blake2b keyed with person=b"tpl" (scheme TEMPLATE_ID_SCHEME); bump the scheme
+    whenever the hash changes so IDs from different schemes aren't compared.
 
     Args:
         intent: intent label.
@@ -90,168 +171,175 @@ def stable_template_id(intent: str, generator: str, index: int, text: str) -> st
     Returns:
         A short stable ID string, e.g., "tpl_3f8a1c2d".
     """
-    payload = f"{intent}||{generator}||{index}||{text}".encode("utf-8")
-    return "tpl_" + sha1(payload).hexdigest()[:8]
+    payload = b"%s||%s||%d||%s" % (intent.encode("utf-8"), generator.encode("utf-8"), index, text.encode("utf-8"))
+    return "tpl_" + blake2b(payload, digest_size=4, person=b"tpl").hexdigest()
 
 
 # 8 intents × 5 generator families × (1 template each by default)
 # You may add more than 1 template per family later, but do not remove or reorder
 # once you start reporting results.
-TEMPLATES: Dict[str, Dict[str, List[str]]] = {
+_TEMPLATES: Dict[str, Dict[str, Tuple[str, ...]]] = {
     "information_seeking": {
-        "direct": [
+        "direct": (
             "What is {concept}?",
-        ],
-        "polite": [
+        ),
+        "polite": (
             "Could you explain {concept} in simple terms?",
-        ],
-        "contextual": [
+        ),
+        "contextual": (
             "In machine learning, why does {phenomenon} happen?",
-        ],
-        "constraint_heavy": [
+        ),
+        "constraint_heavy": (
             "Explain {concept} briefly, with {constraint}.",
-        ],
-        "noisy": [
+        ),
+        "noisy": (
             "whats {concept} and why it matters??",
-        ],
+        ),
     },
 
     "how_to": {
-        "direct": [
+        "direct": (
             "How do I {task}?",
-        ],
-        "polite": [
+        ),
+        "polite": (
             "Please show me how to {task}.",
-        ],
-        "contextual": [
+        ),
+        "contextual": (
             "I'm new to {tool}; how can I {task}?",
-        ],
-        "constraint_heavy": [
+        ),
+        "constraint_heavy": (
             "How do I {task}? Keep it {constraint}.",
-        ],
-        "noisy": [
+        ),
+        "noisy": (
             "how to {task} on {tool}??",
-        ],
+        ),
     },
 
     "troubleshooting": {
-        "direct": [
+        "direct": (
             "Why am I getting {error}?",
-        ],
-        "polite": [
+        ),
+        "polite": (
             "Can you help me fix this error: {error}",
-        ],
-        "contextual": [
+        ),
+        "contextual": (
             "When I {action}, I get {error}. What should I check?",
-        ],
-        "constraint_heavy": [
+        ),
+        "constraint_heavy": (
             "Debug this: {error}. Assume {constraint}.",
-        ],
-        "noisy": [
+        ),
+        "noisy": (
             "it keeps failing: {error} idk why 😭",
-        ],
+        ),
     },
 
     "summarization": {
-        "direct": [
+        "direct": (
             "Summarize this: {text_stub}",
-        ],
-        "polite": [
+        ),
+        "polite": (
             "Please rewrite this to sound {tone}: {text_stub}",
-        ],
-        "contextual": [
+        ),
+        "contextual": (
             "Translate this to {lang}: {text_stub}",
-        ],
-        "constraint_heavy": [
+        ),
+        "constraint_heavy": (
             "Condense this to {constraint}: {text_stub}",
-        ],
-        "noisy": [
+        ),
+        "noisy": (
             "make this nicer/shorter pls: {text_stub}",
-        ],
+        ),
     },
 
     "recommendation": {
-        "direct": [
+        "direct": (
             "Which is better: {a} or {b}?",
-        ],
-        "polite": [
+        ),
+        "polite": (
             "What would you recommend for {goal}?",
-        ],
-        "contextual": [
+        ),
+        "contextual": (
             "Given {constraint}, should I use {option}?",
-        ],
-        "constraint_heavy": [
+        ),
+        "constraint_heavy": (
             "Recommend {k} options for {goal}, {constraint}.",
-        ],
-        "noisy": [
+        ),
+        "noisy": (
             "pick for me: {a} vs {b}",
-        ],
+        ),
     },
 
     "planning": {
-        "direct": [
+        "direct": (
             "Make a plan for {goal}.",
-        ],
-        "polite": [
+        ),
+        "polite": (
             "Can you schedule {goal} over {time_horizon}?",
-        ],
-        "contextual": [
+        ),
+        "contextual": (
             "I have {time_budget} per day. Plan {goal}.",
-        ],
-        "constraint_heavy": [
+        ),
+        "constraint_heavy": (
             "Plan {goal} with {constraint}.",
-        ],
-        "noisy": [
+        ),
+        "noisy": (
             "need a quick plan for {goal} by {time_horizon}!!",
-        ],
+        ),
     },
 
     "creative": {
-        "direct": [
+        "direct": (
             "Write a {artifact} about {topic}.",
-        ],
-        "polite": [
+        ),
+        "polite": (
             "Could you generate {k} {artifact_plural} for {topic}?",
-        ],
-        "contextual": [
+        ),
+        "contextual": (
             "Create a {style} {artifact} for {topic}.",
-        ],
-        "constraint_heavy": [
+        ),
+        "constraint_heavy": (
             "Generate {artifact} with {constraint} about {topic}.",
-        ],
-        "noisy": [
+        ),
+        "noisy": (
             "gimme a {artifact} thats {style}",
-        ],
+        ),
     },
 
     "math": {
-        "direct": [
+        "direct": (
             "Compute {expr}.",
-        ],
-        "polite": [
+        ),
+        "polite": (
             "Can you calculate {quantity} if {given}?",
-        ],
-        "contextual": [
+        ),
+        "contextual": (
             "Estimate {runtime_cost} for {setup}.",
-        ],
-        "constraint_heavy": [
+        ),
+        "constraint_heavy": (
             "Calculate {quantity}. Show {constraint}.",
-        ],
-        "noisy": [
+        ),
+        "noisy": (
             "quick math: {expr}??",
-        ],
+        ),
     },
 }
 
+# Public, read-only view of _TEMPLATES: callers can share TEMPLATES (and its inner
+# mappings) without defensive copies; template lists are already tuples.
+TEMPLATES: Mapping[str, Mapping[str, Tuple[str, ...]]] = MappingProxyType({
+    intent: MappingProxyType(families)
+    for intent, families in _TEMPLATES.items()
+})
+
 
-def iter_templates() -> List[TemplateRef]:
+def _validate_templates() -> None:
     """
-    Flatten the TEMPLATES structure into a list of TemplateRef objects.
+    Check that TEMPLATES covers every (intent, generator) pair with at least one template.
 
-    Returns:
-        A list of TemplateRef, each containing intent, generator, index, template text, and template_id.
+    Raises:
+        KeyError: if an intent or (intent, generator) family is missing.
+        ValueError: if a family has an empty template list.
     """
-    out: List[TemplateRef] = []
     for intent in INTENTS:
         if intent not in TEMPLATES:
             raise KeyError(f"Missing intent in TEMPLATES: {intent}")
@@ -260,13 +348,63 @@ def iter_templates() -> List[TemplateRef]:
             if gen not in TEMPLATES[intent]:
                 raise KeyError(f"Missing generator '{gen}' for intent '{intent}'")
 
-            lst = TEMPLATES[intent][gen]
-            if not lst:
+            if not TEMPLATES[intent][gen]:
                 raise ValueError(f"Empty template list for intent='{intent}', generator='{gen}'")
 
-            for i, text in enumerate(lst):
-                tid = stable_template_id(intent=intent, generator=gen, index=i, text=text)
-                out.append(TemplateRef(intent=intent, generator=gen, index=i, text=text, template_id=tid))
 
-    return out
-   
\ No newline at end of file
+def _build_template_table() -> Tuple[Tuple[TemplateRef, ...], Dict[Tuple[str, str], Tuple[int, int]]]:
+    """
+    Flatten _ALL_TRIPLES once into TemplateRef objects, in INTENTS x GENERATORS order.
+
+    Returns:
+        (refs, family_slices) where family_slices maps (intent, generator) to the
+        (start, end) range of that family's entries in refs.
+    """
+    n = sum(len(texts) for _, _, texts in _ALL_TRIPLES)
+    out: List[Optional[TemplateRef]] = [None] * n
+    slices: Dict[Tuple[str, str], Tuple[int, int]] = {}
+    k = 0
+    for intent, gen, texts in _ALL_TRIPLES:
+        start = k
+        for i, text in enumerate(texts):
+            out[k] = TemplateRef(intent=intent, generator=gen, index=i, text=text)
+            k += 1
+        slices[(intent, gen)] = (start, k)
+
+    return tuple(out), slices  # type: ignore[arg-type]
+
+
+# Flat views of TEMPLATES, built once at import (TEMPLATES is fixed once experiments start).
+_validate_templates()
+# (intent, generator, texts) per family, resolved once so the builder is a single flat loop.
+_ALL_TRIPLES: Tuple[Tuple[str, str, Tuple[str, ...]], ...] = tuple(
+    (intent, gen, TEMPLATES[intent][gen]) for intent in INTENTS for gen in GENERATORS
+)
+_REFS, _FAMILY_SLICES = _build_template_table()
+
+
+def iter_templates() -> Tuple[TemplateRef, ...]:
+    """
+    Flatten the TEMPLATES structure into a tuple of TemplateRef objects.
+
+    The tuple is precomputed at import and shared between callers; copy it
+    (e.g. list(iter_templates())) if you need to modify it.
+
+    Returns:
+        A tuple of TemplateRef, each containing intent, generator, index, template text, and template_id.
+    """
+    return _REFS
+
+
+def family_refs(intent: str, generator: str) -> Tuple[TemplateRef, ...]:
+    """
+    TemplateRefs of one (intent, generator) family, in template-index order.
+
+    Raises:
+        KeyError: if (intent, generator) is not a known family.
+    """
+    try:
+        start, end = _FAMILY_SLICES[(intent, generator)]
+    except KeyError:
+        raise KeyError(f"Unknown template family: intent='{intent}', generator='{generator}'") from None
+    return _REFS[start:end]